@@ -14,24 +14,41 @@
 بيئة التشغيل (Render → Environment):
   BOT_TOKEN=توكن_تيليجرام (مطلوب)
   MAX_BYTES=1900000000         (اختياري: الحد الأقصى ~1.9GB)
+  DOWNLOAD_CHUNK=1048576       (اختياري: حجم قطعة التنزيل بالبايت)
+  MAX_CONCURRENT_DOWNLOADS=2   (اختياري: عدد التنزيلات المتزامنة)
+  MAX_QUEUED_DOWNLOADS=8       (اختياري: أقصى عدد منتظرين؛ بعده نرد "مشغول")
+  DOWNLOAD_DIR=/path/to/dir    (اختياري: مجلد الملفات المؤقتة؛ الافتراضي <tmp>/legaldl-<uid>)
+  LOCAL_BOT_API=http://localhost:8081  (اختياري: خادم Bot API محلي يقرأ الملف من القرص مباشرة؛
+                               يجب أن يعمل telegram-bot-api بنفس uid وعلى نفس نظام الملفات
+                               (نفس الحاوية أو volume مشترك) لأن مجلد التنزيل بصلاحيات 0700)
+  PUBLIC_URL=https://xxx.onrender.com  (اختياري: يفعّل Webhook بدل polling)
+  WH_SECRET=سر_عشوائي          (اختياري: secret_token للتحقق من طلبات تيليجرام)
+  PORT=8080                    (يضبطه Render تلقائيًا في Web Service)
 
-Render (Background Worker):
+Render (Background Worker، أو Web Service عند ضبط PUBLIC_URL):
   Build: pip install -r requirements.txt
   Start: python3 bot_legal_downloader.py
 
 requirements.txt المقترح:
-  python-telegram-bot==21.6
-  httpx==0.27.0
+  python-telegram-bot[webhooks,rate-limiter]==21.6
+  httpx[http2]==0.27.0
+  aiohttp==3.10.10
+  aiolimiter==1.1.1
+  uvloop==0.20.0; sys_platform != "win32"   (يُثبَّت خارج Windows؛ الكود يرجع للحلقة الافتراضية لو غير متوفر)
 """
 from __future__ import annotations
-import os, re, tempfile, mimetypes, logging, asyncio, pathlib
+import os, re, stat, time, shutil, tempfile, mimetypes, logging, asyncio, pathlib, contextlib
 from urllib.parse import urlparse
+from email.message import Message
+from email.utils import collapse_rfc2231_value
 from typing import Optional
 
+import aiohttp
 import httpx
+from aiolimiter import AsyncLimiter
 from telegram import Update
 from telegram.constants import ParseMode
-from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, ContextTypes, filters
+from telegram.ext import AIORateLimiter, ApplicationBuilder, CommandHandler, MessageHandler, ContextTypes, filters
 
 # ===== إعداد =====
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
@@ -42,6 +59,23 @@ if not BOT_TOKEN:
     raise SystemExit("BOT_TOKEN مفقود")
 
 MAX_BYTES = int(os.getenv("MAX_BYTES", "1900000000"))  # ~1.9GB افتراضيًا
+DOWNLOAD_CHUNK = int(os.getenv("DOWNLOAD_CHUNK", str(1 << 20)))  # 1MiB لكل قطعة
+
+# حدود التنزيل: عدد متزامن عام + 3 طلبات/دقيقة لكل مستخدم
+MAX_CONCURRENT_DOWNLOADS = int(os.getenv("MAX_CONCURRENT_DOWNLOADS", "2"))
+MAX_QUEUED_DOWNLOADS = int(os.getenv("MAX_QUEUED_DOWNLOADS", "8"))
+DOWNLOAD_SEM = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+# التنزيلات الجارية + المنتظرة؛ كل واحد منها يحجز خانة من التحديثات المتزامنة في PTB
+_pending_downloads = 0
+USER_LIMITERS: dict[int, AsyncLimiter] = {}
+
+# Webhook (اختياري): لو PUBLIC_URL موجود نستقبل التحديثات بالدفع بدل getUpdates
+PUBLIC_URL = (os.getenv("PUBLIC_URL") or "").strip().rstrip("/")
+WH_SECRET = (os.getenv("WH_SECRET") or "").strip() or None
+PORT = int(os.getenv("PORT", "8080"))
+
+# خادم Bot API محلي (اختياري): نمرّر مسار الملف بدل رفع محتواه عبر بايثون
+LOCAL_BOT_API = (os.getenv("LOCAL_BOT_API") or "").strip().rstrip("/")
 
 # قوائم منع واضحة للمنصّات المحمية (سلاسل جزئية في الـ hostname)
 DENY_HOST_SUBSTR = [
@@ -53,84 +87,291 @@ DENY_HOST_SUBSTR = [
     "spotify", "apple.com", "netflix", "disney", "primevideo", "hulu", "osn", "shahid",
 ]
 
+# نمط واحد مُجمّع مسبقًا بدل المرور على القائمة لكل رابط
+_DENY_RE = re.compile("|".join(re.escape(s) for s in DENY_HOST_SUBSTR))
+
 ALLOWED_SCHEMES = {"http", "https"}
 
 # ===== HTTP عميل =====
+# تُبنى العملاء مرة واحدة في post_init (داخل الحلقة) وتُغلق في post_shutdown
 _http: Optional[httpx.AsyncClient] = None
+# جلسة aiohttp لجسم الملف فقط (httpx يبقى لـ HEAD والميتاداتا)
+_session: Optional[aiohttp.ClientSession] = None
 
 def http() -> httpx.AsyncClient:
-    global _http
-    if _http is None:
-        _http = httpx.AsyncClient(timeout=60)
     return _http
 
+def session() -> aiohttp.ClientSession:
+    return _session
+
+async def init_http(app=None):
+    global _http, _session
+    # عميل واحد مشترك: إعادة استخدام اتصالات TCP/TLS مع HTTP/2 وحدود مجمّع أوسع
+    # إعادة المحاولة لأخطاء الاتصال تتم داخل طبقة النقل (الحدود وHTTP/2 تُضبط عليها)
+    transport = httpx.AsyncHTTPTransport(
+        retries=3,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=30.0),
+        http2=True,
+    )
+    _http = httpx.AsyncClient(
+        transport=transport,
+        timeout=httpx.Timeout(connect=5.0, read=60.0, write=60.0, pool=5.0),
+        headers={"User-Agent": "legaldl/1"},
+    )
+    _session = aiohttp.ClientSession(
+        timeout=aiohttp.ClientTimeout(total=None, sock_connect=5, sock_read=60),
+        headers={"User-Agent": "legaldl/1"},
+    )
+
+async def post_init(app):
+    await init_http(app)
+    prepare_temp_dir()
+    sweep_stale_tempfiles()
+
+async def close_http(app=None):
+    global _http, _session
+    if _http is not None:
+        await _http.aclose()
+        _http = None
+    if _session is not None:
+        await _session.close()
+        _session = None
+
 # ===== أدوات =====
 
-def is_denied_host(url: str) -> bool:
-    try:
-        host = urlparse(url).hostname or ""
-        host = host.lower()
-        return any(s in host for s in DENY_HOST_SUBSTR)
-    except Exception:
-        return True
+def is_denied_host(host: str) -> bool:
+    # host من ParseResult.hostname (بأحرف صغيرة أصلًا)
+    return _DENY_RE.search(host or "") is not None
+
+# كاش قصير لنتائج HEAD: نفس الرابط خلال دقائق لا يحتاج طلبًا جديدًا
+META_TTL = 300
+META_CACHE_MAX = 1024
+_meta_cache: dict[str, tuple[float, tuple]] = {}
+# طلب واحد فقط قيد التنفيذ لكل رابط؛ البقية ينتظرون نفس النتيجة
+_meta_inflight: dict[str, asyncio.Task] = {}
 
 async def head_for_meta(url: str):
-    r = await http().head(url, follow_redirects=True)
-    # بعض السيرفرات لا تدعم HEAD جيدًا؛ نجرب GET بدون تحميل الجسم
-    if r.status_code >= 400:
-        r = await http().get(url, follow_redirects=True, headers={"Range": "bytes=0-0"})
-    cl = int(r.headers.get("Content-Length") or r.headers.get("content-length") or 0)
-    ct = r.headers.get("Content-Type") or r.headers.get("content-type") or ""
-    disp = r.headers.get("Content-Disposition") or r.headers.get("content-disposition") or ""
+    now = time.monotonic()
+    hit = _meta_cache.get(url)
+    if hit and hit[0] > now:
+        return hit[1]
+    task = _meta_inflight.get(url)
+    if task is None:
+        task = asyncio.ensure_future(_fetch_meta(url))
+        _meta_inflight[url] = task
+        task.add_done_callback(lambda _t: _meta_inflight.pop(url, None))
+    # shield: إلغاء أحد المنتظرين لا يلغي الطلب المشترك
+    meta = await asyncio.shield(task)
+    now = time.monotonic()
+    # احذف المدخل القديم لنفس الرابط حتى يُعاد إدراجه في آخر الترتيب
+    _meta_cache.pop(url, None)
+    if len(_meta_cache) >= META_CACHE_MAX:
+        # المنتهية أولًا، ثم الأقدم إدخالًا لو ما زال ممتلئًا
+        for k in [k for k, (exp, _m) in _meta_cache.items() if exp <= now]:
+            del _meta_cache[k]
+        if len(_meta_cache) >= META_CACHE_MAX:
+            _meta_cache.pop(next(iter(_meta_cache)))
+    _meta_cache[url] = (now + META_TTL, meta)
+    return meta
+
+# 405/501: HEAD غير مدعوم. 403: روابط موقّعة (S3 وأمثالها) صالحة لـ GET فقط
+HEAD_FALLBACK_STATUSES = frozenset({403, 405, 501})
+
+# أقصى عدد محدِّدات نحتفظ بها لكل جدول (مضيفين/مستخدمين)
+LIMITERS_MAX = 1024
+
+def bounded_limiter(table: dict, key, max_rate: float, time_period: float) -> AsyncLimiter:
+    lim = table.get(key)
+    if lim is not None:
+        return lim
+    if len(table) >= LIMITERS_MAX:
+        # احذف المحدِّدات الخاملة (الدلو فارغ تمامًا)، وإلا الأقدم إدخالًا
+        for k in [k for k, v in table.items() if v.has_capacity(v.max_rate)]:
+            del table[k]
+        if len(table) >= LIMITERS_MAX:
+            table.pop(next(iter(table)))
+    lim = table[key] = AsyncLimiter(max_rate, time_period)
+    return lim
+
+# حد لكل مضيف حتى لا نغرق المصدر بطلبات HEAD عند الزحمة
+_host_limiters: dict[str, AsyncLimiter] = {}
+
+def host_limiter(url: str) -> AsyncLimiter:
+    host = (urlparse(url).hostname or "").lower()
+    return bounded_limiter(_host_limiters, host, 50, 1)
+
+_CONTENT_RANGE_RE = re.compile(r"bytes\s+\d+-\d+/(\d+)")
+
+def content_range_total(value: str) -> int:
+    m = _CONTENT_RANGE_RE.match(value.strip())
+    return int(m.group(1)) if m else 0  # "*" أو قيمة غير مفهومة → حجم غير معروف
+
+async def _fetch_meta(url: str):
+    async with host_limiter(url):
+        r = await http().head(url, follow_redirects=True)
+        # بعض السيرفرات ترفض HEAD نفسه؛ فقط عندها نجرب GET بدون تحميل الجسم
+        if r.status_code in HEAD_FALLBACK_STATUSES:
+            # stream: لا نقرأ الجسم حتى لو تجاهل السيرفر Range وأرسل الملف كاملًا
+            async with http().stream("GET", url, follow_redirects=True, headers={"Range": "bytes=0-0"}) as r:
+                pass
+        r.raise_for_status()
+    # httpx.Headers غير حسّاسة لحالة الأحرف؛ بحث واحد يكفي
+    cl = int(r.headers.get("content-length") or 0)
+    if r.status_code == 206:
+        # Content-Length هنا لبايت واحد؛ الحجم الكلي في Content-Range: bytes 0-0/<total>
+        cl = content_range_total(r.headers.get("content-range", ""))
+    ct = r.headers.get("content-type", "")
+    disp = r.headers.get("content-disposition", "")
+    # لا نخزّن الرابط النهائي: روابط التحويل الموقّعة قصيرة العمر، وaiohttp يتبع التحويلات بنفسه
     return cl, ct, disp
 
-def guess_filename(url: str, content_disposition: str) -> str:
-    # من Content-Disposition
-    m = re.search(r'filename\*=UTF-8''([^;\n]+)', content_disposition)
-    if m:
-        return m.group(1)
-    m = re.search(r'filename="?([^";]+)"?', content_disposition)
-    if m:
-        return m.group(1)
+def guess_filename(path: str, content_disposition: str) -> str:
+    # من Content-Disposition: نفضّل filename*=UTF-8''… (RFC 2231/5987) على filename العادي
+    if content_disposition:
+        msg = Message()
+        msg["content-disposition"] = content_disposition
+        plain = None
+        for key, value in msg.get_params(header="content-disposition") or ():
+            if key != "filename":
+                continue
+            if isinstance(value, tuple):
+                name = collapse_rfc2231_value(value)
+                if name:
+                    return name
+            elif plain is None:
+                plain = value
+        if plain:
+            return plain
     # من مسار الرابط
-    name = pathlib.Path(urlparse(url).path).name
+    name = pathlib.Path(path).name
     if name:
         return name
     return "file"
 
+# ===== نصوص ثابتة (تُبنى مرة واحدة عند التحميل) =====
+START_TEXT = (
+    "👋 أهلاً!\n"
+    "أرسل أمر: `/download <الرابط>` لتنزيل ملف وسائط *مسموح* (من رابط مباشر فقط).\n"
+    "هذا البوت لا ينزل من يوتيوب/تيك توك/انستقرام/سناب وغيرها.")
+
+STATUS_TEXT = (
+    "• BOT_TOKEN: ✅\n"
+    f"• MAX_BYTES: `{MAX_BYTES}`\n"
+    "• القيود: منع المنصّات المحمية مفعّل")
+
+USAGE_TEXT = "استخدم: `/download https://example.com/video.mp4`"
+
+MEDIA_EXTS = frozenset({".mp4", ".mov", ".mkv", ".webm", ".m4a", ".mp3", ".aac"})
+
+TEMP_PREFIX = "dl_"
+# مجلد خاص بالبوت (لكل مستخدم نظام) حتى لا يلمس التنظيف ملفات برامج أخرى
+_UID = os.getuid() if hasattr(os, "getuid") else None
+TEMP_DIR = pathlib.Path(
+    os.getenv("DOWNLOAD_DIR")
+    or pathlib.Path(tempfile.gettempdir()) / (f"legaldl-{_UID}" if _UID is not None else "legaldl")
+)
+
+def prepare_temp_dir():
+    # /tmp مشترك: نرفض مجلدًا أنشأه غيرنا أو رابطًا رمزيًا بدل استخدامه بصمت
+    TEMP_DIR.mkdir(mode=0o700, parents=True, exist_ok=True)
+    st = TEMP_DIR.lstat()
+    if stat.S_ISLNK(st.st_mode) or not stat.S_ISDIR(st.st_mode):
+        raise SystemExit(f"{TEMP_DIR} ليس مجلدًا عاديًا")
+    if _UID is not None and st.st_uid != _UID:
+        raise SystemExit(f"{TEMP_DIR} مملوك لمستخدم آخر")
+    os.chmod(TEMP_DIR, 0o700)
+
+def safe_basename(name: str) -> str:
+    # اسم ملف فقط، بدون أي مسار قادم من الرابط أو Content-Disposition
+    base = name.replace("\\", "/").replace("\0", "").rsplit("/", 1)[-1].strip()
+    return base if base not in ("", ".", "..") else "file"
+
+@contextlib.contextmanager
+def temp_download(name: Optional[str] = None):
+    # الملف يُحذف دائمًا عند الخروج مهما كان سبب الخروج.
+    # مع name: مجلد مؤقت خاص يحوي الملف باسمه الحقيقي، لأن الوضع المحلي يرسل المسار
+    # كـ file:// ويتجاهل filename= فيظهر للمستخدم اسم الملف على القرص.
+    if name is None:
+        f = tempfile.NamedTemporaryFile(prefix=TEMP_PREFIX, dir=TEMP_DIR, delete=False, buffering=0)
+        cleanup = lambda: os.remove(f.name)
+    else:
+        d = tempfile.mkdtemp(prefix=TEMP_PREFIX, dir=TEMP_DIR)
+        f = open(os.path.join(d, safe_basename(name)), "w+b", buffering=0)
+        cleanup = lambda: shutil.rmtree(d)
+    try:
+        yield f
+    finally:
+        f.close()
+        try:
+            cleanup()
+        except OSError:
+            pass
+
+def write_all(fd: int, data: bytes):
+    # كتابة مباشرة على الـ fd؛ os.write قد يكتب جزءًا فقط فنكمل الباقي
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+def sweep_stale_tempfiles(max_age: float = 3600):
+    # ملفات/مجلدات dl_* متبقية من تشغيل سابق انهار قبل التنظيف
+    cutoff = time.time() - max_age
+    for p in TEMP_DIR.glob(f"{TEMP_PREFIX}*"):
+        try:
+            if p.lstat().st_mtime >= cutoff:
+                continue
+            if p.is_dir() and not p.is_symlink():
+                shutil.rmtree(p)
+            else:
+                p.unlink()
+            log.info("removed stale temp file %s", p)
+        except OSError:
+            pass
+
+def user_limiter(update: Update) -> AsyncLimiter:
+    # المشرف المجهول/القناة يظهران بنفس effective_user لكل المرسلين؛ نستخدم المحادثة بدلها
+    msg = update.effective_message
+    if msg is not None and msg.sender_chat is not None:
+        key = update.effective_chat.id
+    else:
+        key = update.effective_user.id
+    return bounded_limiter(USER_LIMITERS, key, 3, 60)
+
 # ===== Handlers =====
 async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    txt = (
-        "👋 أهلاً!\n"
-        "أرسل أمر: `/download <الرابط>` لتنزيل ملف وسائط *مسموح* (من رابط مباشر فقط).\n"
-        "هذا البوت لا ينزل من يوتيوب/تيك توك/انستقرام/سناب وغيرها.")
-    await update.effective_chat.send_message(txt, parse_mode=ParseMode.MARKDOWN)
+    await update.effective_chat.send_message(START_TEXT, parse_mode=ParseMode.MARKDOWN)
 
 async def cmd_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    ok = "✅"; no = "❌"
-    await update.effective_chat.send_message(
-        f"• BOT_TOKEN: {ok}\n"
-        f"• MAX_BYTES: `{MAX_BYTES}`\n"
-        f"• القيود: منع المنصّات المحمية مفعّل",
-        parse_mode=ParseMode.MARKDOWN,
-    )
+    await update.effective_chat.send_message(STATUS_TEXT, parse_mode=ParseMode.MARKDOWN)
 
 async def cmd_download(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    global _pending_downloads
     # اجلب الرابط
     args = context.args or []
     if not args:
-        await update.effective_chat.send_message("استخدم: `/download https://example.com/video.mp4`", parse_mode=ParseMode.MARKDOWN)
+        await update.effective_chat.send_message(USAGE_TEXT, parse_mode=ParseMode.MARKDOWN)
         return
     url = args[0].strip()
     # تحقق من الصيغة
-    parsed = urlparse(url)
-    if parsed.scheme not in ALLOWED_SCHEMES or not parsed.netloc:
+    try:
+        parsed = urlparse(url)
+        host = parsed.hostname
+    except ValueError:
+        parsed = host = None
+    if parsed is None or parsed.scheme not in ALLOWED_SCHEMES or not host:
         await update.effective_chat.send_message("رابط غير صالح.")
         return
     # منع المنصّات المحمية
-    if is_denied_host(url):
+    if is_denied_host(host):
         await update.effective_chat.send_message("هذا الرابط من منصة محمية—لا يمكن تنزيله هنا. أرسل رابطًا مباشرًا مسموحًا.")
         return
+    # حد لكل مستخدم
+    lim = user_limiter(update)
+    if not lim.has_capacity():
+        wait = int(lim.time_period / lim.max_rate)
+        await update.effective_chat.send_message(f"طلبات كثيرة، حاول بعد ~{wait} ثانية.")
+        return
+    await lim.acquire()
 
     # قراءة الميتاداتا
     try:
@@ -140,9 +381,9 @@ async def cmd_download(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # القبول: محتوى فيديو/صوت أو امتداد معروف
-    ext = pathlib.Path(urlparse(url).path).suffix.lower()
+    ext = pathlib.Path(parsed.path).suffix.lower()
     ok_mime = (ctype.startswith("video/") or ctype.startswith("audio/"))
-    ok_ext = ext in {".mp4", ".mov", ".mkv", ".webm", ".m4a", ".mp3", ".aac"}
+    ok_ext = ext in MEDIA_EXTS
     if not (ok_mime or ok_ext):
         await update.effective_chat.send_message("الرابط لا يبدو كملف وسائط مباشر.")
         return
@@ -152,41 +393,51 @@ async def cmd_download(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.effective_chat.send_message("الملف كبير جدًا بالنسبة للإرسال هنا.")
         return
 
-    file_name = guess_filename(url, disp)
+    file_name = guess_filename(parsed.path, disp)
     if not pathlib.Path(file_name).suffix:
         # حاول تخمين الامتداد من المايم تايب
         ext2 = mimetypes.guess_extension(ctype) or ext or ".bin"
         file_name += ext2
 
+    # طابور محدود: لو امتلأ نرد فورًا بدل حجز خانة تحديث لدقائق
+    if _pending_downloads >= MAX_CONCURRENT_DOWNLOADS + MAX_QUEUED_DOWNLOADS:
+        await update.effective_chat.send_message("🚦 البوت مشغول حاليًا، حاول بعد قليل.")
+        return
+    if DOWNLOAD_SEM.locked():
+        await update.effective_chat.send_message("⏳ في الطابور… سيبدأ التنزيل عند انتهاء تنزيل آخر.")
+    _pending_downloads += 1
+    try:
+        async with DOWNLOAD_SEM:
+            await _download_and_send(update, url, file_name)
+    finally:
+        _pending_downloads -= 1
+
+async def _download_and_send(update: Update, url: str, file_name: str):
     await update.effective_chat.send_message("جاري التنزيل… قد يستغرق بعض الوقت حسب الحجم.")
 
-    # تنزيل إلى ملف مؤقت ثم الإرسال
+    # تنزيل إلى ملف مؤقت ثم الإرسال من نفس المقبض (بدون open ثانٍ)
     try:
-        async with http().stream("GET", url, follow_redirects=True) as r:
-            r.raise_for_status()
-            with tempfile.NamedTemporaryFile(prefix="dl_", delete=False) as f:
+        with temp_download(file_name if LOCAL_BOT_API else None) as f:
+            async with session().get(url) as r:
+                r.raise_for_status()
+                # قطع كبيرة → كتابة مباشرة بدون طبقة buffer إضافية
+                fd = f.fileno()
                 total = 0
-                async for chunk in r.aiter_bytes(64 * 1024):
-                    f.write(chunk)
+                async for chunk in r.content.iter_chunked(DOWNLOAD_CHUNK):
+                    write_all(fd, chunk)
                     total += len(chunk)
                     if total > MAX_BYTES:
                         raise RuntimeError("file too large")
-                temp_path = f.name
-        # أرسل
-        await update.effective_chat.send_document(document=open(temp_path, "rb"), filename=file_name, caption=f"تم التحميل ✅\n{file_name}")
+            f.seek(0)
+            # أرسل: في الوضع المحلي يقرأ الخادم الملف من القرص دون المرور بذاكرة البوت
+            document = pathlib.Path(f.name) if LOCAL_BOT_API else f
+            await update.effective_chat.send_document(document=document, filename=file_name, caption=f"تم التحميل ✅\n{file_name}")
     except RuntimeError:
         await update.effective_chat.send_message("الحجم تعدّى الحد المسموح.")
-    except httpx.HTTPError:
+    except (httpx.HTTPError, aiohttp.ClientError, asyncio.TimeoutError):
         await update.effective_chat.send_message("فشل التحميل من المصدر.")
     except Exception:
         await update.effective_chat.send_message("حدث خطأ غير متوقع أثناء التحميل.")
-    finally:
-        # نظّف الملف المؤقت
-        try:
-            if 'temp_path' in locals():
-                os.remove(temp_path)
-        except Exception:
-            pass
 
 # أي نص غير الأوامر → مساعدة قصيرة
 async def on_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -194,9 +445,48 @@ async def on_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # ===== تطبيق =====
 if __name__ == "__main__":
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+    # حلقة uvloop (اختيارية) أسرع للتطبيقات المعتمدة على الشبكة؛ نرجع للافتراضية لو غير مثبتة
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
+
+    builder = (
+        ApplicationBuilder()
+        .token(BOT_TOKEN)
+        # معالجة متزامنة للتحديثات؛ DOWNLOAD_SEM هو ما يحدّ التنزيلات الثقيلة
+        .concurrent_updates(True)
+        # مجمّع مستقل لـ getUpdates حتى لا يحجز long-poll اتصالات الإرسال
+        .connection_pool_size(32)
+        .pool_timeout(10.0)
+        .get_updates_connection_pool_size(4)
+        .get_updates_pool_timeout(30.0)
+        # يوزّع الإرسال ضمن حدود تيليجرام بدل الاصطدام بـ 429
+        .rate_limiter(AIORateLimiter(overall_max_rate=28, overall_time_period=1, max_retries=3))
+        .post_init(post_init)
+        .post_shutdown(close_http)
+    )
+    if LOCAL_BOT_API:
+        builder = (
+            builder
+            .base_url(f"{LOCAL_BOT_API}/bot")
+            .base_file_url(f"{LOCAL_BOT_API}/file/bot")
+            .local_mode(True)
+        )
+    app = builder.build()
     app.add_handler(CommandHandler("start", cmd_start))
     app.add_handler(CommandHandler("status", cmd_status))
     app.add_handler(CommandHandler("download", cmd_download))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, on_text))
-    app.run_polling(drop_pending_updates=True)
+    if PUBLIC_URL:
+        app.run_webhook(
+            listen="0.0.0.0",
+            port=PORT,
+            url_path=BOT_TOKEN,
+            webhook_url=f"{PUBLIC_URL}/{BOT_TOKEN}",
+            secret_token=WH_SECRET,
+            drop_pending_updates=True,
+        )
+    else:
+        app.run_polling(drop_pending_updates=True)